@@ -1,5 +1,7 @@
 import csv
+import functools
 import glob
+import itertools
 import logging
 import os
 import typing as t
@@ -11,6 +13,10 @@ import attrs
 from tabulate import tabulate
 from unidecode import unidecode
 
+from irs.broker.fx import BASE_CURRENCY, FxRates
+from irs.broker.mapped import MappedCsvFile
+from irs.broker.positions import PositionIndex
+
 # from irs import SaleRecord
 
 _logger = logging.getLogger(__name__)
@@ -22,6 +28,63 @@ def normalize(in_str):
     return f"empty_field"
 
 
+@functools.lru_cache(maxsize=8192)
+def parse_date(value: str) -> datetime:
+    # Broker exports repeat the same trade dates on many rows.
+    return datetime.strptime(value, "%d-%m-%Y")
+
+
+def normalize_headers(raw_headers: t.List[str]) -> t.List[str]:
+    headers = []
+    seen = {}
+    for index, header in enumerate(raw_headers):
+        normalized = normalize(header)
+        if normalized == "empty_field":
+            normalized = f"empty_field_{index}"
+        if normalized in seen:
+            seen[normalized] += 1
+            normalized = f"{normalized}_{seen[normalized]}"
+        else:
+            seen[normalized] = 0
+        headers.append(normalized)
+    return headers
+
+
+# Column aliases read by ``Portfolio.harmonize_data``, PT export first.
+DATE_COLUMNS = ("data", "date")
+ISIN_COLUMNS = ("isin",)
+NAME_COLUMNS = ("produto", "product")
+ORDER_ID_COLUMNS = ("id_da_ordem", "order_id")
+FALLBACK_ORDER_ID_COLUMNS = ("empty_field_17",)
+EUR_VALUE_COLUMNS = ("valor", "value_eur")
+LOCAL_VALUE_COLUMNS = ("valor_local", "local_value")
+VALUE_COLUMNS = (*EUR_VALUE_COLUMNS, "valor_local")
+CURRENCY_COLUMNS = ("empty_field_10",)
+UNIT_COLUMNS = ("quantidade", "quantity")
+PRICE_COLUMNS = ("precos", "price")
+COMMISSION_COLUMNS = (
+    "custos_de_transacao",
+    "transaction_and/or_third_party_fees_eur",
+)
+
+HARMONIZED_COLUMNS = frozenset(
+    itertools.chain(
+        DATE_COLUMNS,
+        ISIN_COLUMNS,
+        NAME_COLUMNS,
+        ORDER_ID_COLUMNS,
+        FALLBACK_ORDER_ID_COLUMNS,
+        EUR_VALUE_COLUMNS,
+        LOCAL_VALUE_COLUMNS,
+        VALUE_COLUMNS,
+        CURRENCY_COLUMNS,
+        UNIT_COLUMNS,
+        PRICE_COLUMNS,
+        COMMISSION_COLUMNS,
+    )
+)
+
+
 @attrs.define
 class Transaction:
     date: t.Optional[datetime.date] = None
@@ -108,11 +171,16 @@ class Product:
 
     def declare(self):
 
+        # Start from unmatched orders so declaring again yields the same records.
+        for order in self.order_history:
+            order.unrealized_unit = abs(order.unit)
+
         records = []
+        buy_orders = self.buy_orders
 
         for sell_order in self.sell_orders:
             # _logger.debug(f"Processing order {sell_order.name}: {sell_order.unit}")
-            for buy_order in self.buy_orders:
+            for buy_order in buy_orders:
                 if buy_order.unrealized_unit == 0:
                     continue
                 # _logger.debug(f"Matching buy order {buy_order.name}")
@@ -142,24 +210,31 @@ class Product:
 class Portfolio:
     products: t.List["Product"] = attr.ib(factory=list)
     order_history: t.List["Order"] = attr.ib(factory=list)
+    _products_by_isin: t.Dict[str, "Product"] = attr.ib(
+        factory=dict, init=False, repr=False
+    )
+    _orders_by_id: t.Dict[str, "Order"] = attr.ib(factory=dict, init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        self._products_by_isin.update((p.isin, p) for p in self.products)
+        self._orders_by_id.update((o.order_id, o) for o in self.order_history)
 
     def update(self, order):
         if (product := self.get_product(order.isin)) is None:
             product = Product(isin=order.isin, name=order.name)
             self.products.append(product)
+            self._products_by_isin[product.isin] = product
         product.update(order)
 
     def get_product(self, isin):
-        for product in self.products:
-            if product.isin == isin:
-                return product
-        return None
+        return self._products_by_isin.get(isin)
 
     def get_order(self, order_id: str):
-        for order in self.order_history:
-            if order.order_id == order_id:
-                return order
-        return None
+        return self._orders_by_id.get(order_id)
+
+    def position_index(self) -> PositionIndex:
+        """Index answering positions, open lots and realized gains as of a date."""
+        return PositionIndex.from_portfolio(self)
 
     def open_position(self):
         open_positions = [p for p in self.products if p.unit > 0]
@@ -176,9 +251,19 @@ class Portfolio:
         )
 
     @classmethod
-    def from_transaction_csv_files(cls, input_dir):
+    def from_transaction_csv_files(
+        cls, input_dir, fx: t.Optional[FxRates] = None, mapped=False
+    ):
         instance = cls()
-        instance.load(cls.harmonize_data(cls.read(input_dir)))
+        if mapped:
+            # Stream the projected rows so the raw cells are never all held at once.
+            raw_rows = itertools.chain.from_iterable(
+                cls.iter_mapped_file(file_path)
+                for file_path in cls.csv_files(input_dir)
+            )
+        else:
+            raw_rows = cls.read(input_dir)
+        instance.load(cls.harmonize_data(raw_rows, fx=fx))
         return instance
 
     @staticmethod
@@ -203,36 +288,48 @@ class Portfolio:
         return float(raw)
 
     @classmethod
-    def harmonize_data(cls, raw_rows: t.List[dict]) -> t.List[dict]:
+    def harmonize_data(
+        cls, raw_rows: t.Iterable[dict], fx: t.Optional[FxRates] = None
+    ) -> t.List[dict]:
         harmonized = []
+        foreign = []
         for row in raw_rows:
-            order_id = cls._pick(row, "id_da_ordem", "order_id")
+            order_id = cls._pick(row, *ORDER_ID_COLUMNS)
             # Newer EN DEGIRO exports can place the order id in trailing blank column.
             if not order_id and "product" in row:
-                fallback_order_id = cls._pick(row, "empty_field_17")
+                fallback_order_id = cls._pick(row, *FALLBACK_ORDER_ID_COLUMNS)
                 if fallback_order_id and fallback_order_id != "EUR":
                     order_id = fallback_order_id
 
+            # Without a EUR value, convert the local value at the trade-date rate.
+            if fx is not None and not cls._pick(row, *EUR_VALUE_COLUMNS):
+                local_value = cls._pick(row, *LOCAL_VALUE_COLUMNS)
+                currency = cls._pick(row, *CURRENCY_COLUMNS, default=BASE_CURRENCY)
+                if local_value and currency != BASE_CURRENCY:
+                    foreign.append(
+                        (len(harmonized), cls._to_float(local_value), currency)
+                    )
+
             harmonized.append(
                 {
-                    "date": cls._pick(row, "data", "date"),
-                    "isin": cls._pick(row, "isin"),
-                    "name": cls._pick(row, "produto", "product"),
+                    "date": cls._pick(row, *DATE_COLUMNS),
+                    "isin": cls._pick(row, *ISIN_COLUMNS),
+                    "name": cls._pick(row, *NAME_COLUMNS),
                     "order_id": order_id,
-                    "value": cls._to_float(
-                        cls._pick(row, "valor", "value_eur", "valor_local")
-                    ),
-                    "unit": int(cls._to_float(cls._pick(row, "quantidade", "quantity"))),
-                    "unit_value": cls._to_float(cls._pick(row, "precos", "price")),
-                    "commission": cls._to_float(
-                        cls._pick(
-                            row,
-                            "custos_de_transacao",
-                            "transaction_and/or_third_party_fees_eur",
-                        )
-                    ),
+                    "value": cls._to_float(cls._pick(row, *VALUE_COLUMNS)),
+                    "unit": int(cls._to_float(cls._pick(row, *UNIT_COLUMNS))),
+                    "unit_value": cls._to_float(cls._pick(row, *PRICE_COLUMNS)),
+                    "commission": cls._to_float(cls._pick(row, *COMMISSION_COLUMNS)),
                 }
             )
+
+        if foreign:
+            indexes, amounts, currencies = zip(*foreign)
+            dates = [parse_date(harmonized[index]["date"]) for index in indexes]
+            for index, value in zip(
+                indexes, fx.to_eur_many(amounts, currencies, dates)
+            ):
+                harmonized[index]["value"] = value
         return harmonized
 
     def load(self, data: t.List[dict]):
@@ -241,7 +338,7 @@ class Portfolio:
             isin = item["isin"]
             name = item["name"]
             txn = Transaction(
-                date=datetime.strptime(item["date"], "%d-%m-%Y"),
+                date=parse_date(item["date"]),
                 value=item["value"],
                 unit=item["unit"],
                 unit_value=item["unit_value"],
@@ -256,6 +353,7 @@ class Portfolio:
             if (order := self.get_order(order_id)) is None:
                 order = Order(isin=isin, name=name, order_id=order_id, split=split)
                 self.order_history.append(order)
+                self._orders_by_id[order_id] = order
 
             if order:
                 order.update(txn)
@@ -264,26 +362,43 @@ class Portfolio:
             self.update(order)
 
     @staticmethod
-    def read(input_dir) -> t.List:
+    def read_file(file_path, mapped=False) -> t.List:
+        """Read a broker csv file into dicts keyed by normalized header.
+
+        With ``mapped`` the file is memory-mapped and only the
+        ``HARMONIZED_COLUMNS`` are decoded, which keeps huge exports cheap.
+        """
+        if mapped:
+            return list(Portfolio.iter_mapped_file(file_path))
+
+        data = []
+        with open(file_path, "r", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            headers = normalize_headers(next(reader, []))
+            for row in reader:
+                data.append(dict(zip(headers, row)))
+        return data
+
+    @staticmethod
+    def iter_mapped_file(file_path) -> t.Iterator[dict]:
+        with MappedCsvFile(file_path) as file:
+            headers = normalize_headers(file.header())
+            indexes = [
+                i for i, header in enumerate(headers) if header in HARMONIZED_COLUMNS
+            ]
+            columns = [headers[i] for i in indexes]
+            for row in file.records(indexes, skip=1):
+                yield dict(zip(columns, row))
+
+    @staticmethod
+    def csv_files(input_dir) -> t.List[str]:
+        return sorted(glob.glob(os.path.join(input_dir, "*.csv")))
+
+    @classmethod
+    def read(cls, input_dir, mapped=False) -> t.List:
         data = []
-        for file_path in glob.glob(os.path.join(input_dir, "*.csv")):
-            with open(file_path, "r", encoding="utf-8") as file:
-                reader = csv.reader(file)
-                raw_headers = next(reader, [])
-                headers = []
-                seen = {}
-                for index, header in enumerate(raw_headers):
-                    normalized = normalize(header)
-                    if normalized == "empty_field":
-                        normalized = f"empty_field_{index}"
-                    if normalized in seen:
-                        seen[normalized] += 1
-                        normalized = f"{normalized}_{seen[normalized]}"
-                    else:
-                        seen[normalized] = 0
-                    headers.append(normalized)
-                for row in reader:
-                    data.append(dict(zip(headers, row)))
+        for file_path in cls.csv_files(input_dir):
+            data.extend(cls.read_file(file_path, mapped=mapped))
         return data
 
     def declare(self) -> t.Tuple[t.List[t.Tuple], t.Optional[t.List]]:
@@ -0,0 +1,142 @@
+import csv
+import glob
+import logging
+import os
+import typing as t
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime
+
+import attr
+import attrs
+
+_logger = logging.getLogger(__name__)
+
+
+BASE_CURRENCY = "EUR"
+
+
+@attrs.define
+class FxRates:
+    """ECB reference rates (units of currency per EUR) indexed by date.
+
+    Each currency is held as two parallel arrays, sorted date ordinals and
+    rates, so a lookup is a binary search for the latest rate on or before the
+    trade date. Rates older than ``max_age`` days are rejected rather than
+    silently reused.
+    """
+
+    max_age: int = 7
+    _dates: t.Dict[str, array] = attr.ib(factory=dict, init=False, repr=False)
+    _rates: t.Dict[str, array] = attr.ib(factory=dict, init=False, repr=False)
+
+    @classmethod
+    def from_csv_files(cls, path, max_age: int = 7) -> "FxRates":
+        """Load a single ECB csv file or every csv file in a directory."""
+        if os.path.isdir(path):
+            file_paths = sorted(glob.glob(os.path.join(path, "*.csv")))
+        else:
+            file_paths = [path]
+        instance = cls(max_age=max_age)
+        observations = {}
+        for file_path in file_paths:
+            for currency, day, rate in cls.read(file_path):
+                observations.setdefault(currency, {})[day] = rate
+        for currency, by_day in observations.items():
+            days = sorted(by_day)
+            instance._dates[currency] = array("l", days)
+            instance._rates[currency] = array("d", (by_day[day] for day in days))
+        _logger.debug("loaded fx rates for %s", ", ".join(sorted(observations)))
+        return instance
+
+    @staticmethod
+    def read(file_path) -> t.Iterator[t.Tuple[str, int, float]]:
+        """Yield (currency, date ordinal, rate) from an ECB csv file.
+
+        Both the wide ``eurofxref-hist.csv`` layout (Date,USD,JPY,...) and the
+        long SDMX layout (CURRENCY,TIME_PERIOD,OBS_VALUE,...) are understood.
+        """
+        with open(file_path, "r", encoding="utf-8-sig") as file:
+            reader = csv.reader(file)
+            headers = [h.strip() for h in next(reader, [])]
+            if {"CURRENCY", "TIME_PERIOD", "OBS_VALUE"} <= set(headers):
+                currency_idx = headers.index("CURRENCY")
+                date_idx = headers.index("TIME_PERIOD")
+                value_idx = headers.index("OBS_VALUE")
+                for row in reader:
+                    if row[value_idx] in ("", "N/A", "NaN"):
+                        continue
+                    yield (
+                        row[currency_idx],
+                        date.fromisoformat(row[date_idx]).toordinal(),
+                        float(row[value_idx]),
+                    )
+                return
+
+            columns = [(i, h) for i, h in enumerate(headers[1:], start=1) if h]
+            for row in reader:
+                if not row or not row[0]:
+                    continue
+                day = date.fromisoformat(row[0].strip()).toordinal()
+                for index, currency in columns:
+                    value = row[index].strip() if index < len(row) else ""
+                    if value in ("", "N/A", "NaN"):
+                        continue
+                    yield currency, day, float(value)
+
+    @property
+    def currencies(self) -> t.List[str]:
+        return sorted(self._dates)
+
+    def _series(self, currency: str) -> t.Tuple[array, array]:
+        if currency not in self._dates:
+            raise LookupError(f"no fx rates for {currency}")
+        return self._dates[currency], self._rates[currency]
+
+    def _rate(self, currency, day, dates, rates) -> float:
+        index = bisect_right(dates, day) - 1
+        if index < 0 or day - dates[index] > self.max_age:
+            raise LookupError(
+                f"no {currency} rate within {self.max_age} days of "
+                f"{date.fromordinal(day)}"
+            )
+        return rates[index]
+
+    def rate(self, currency: str, when: t.Union[date, datetime]) -> float:
+        if currency == BASE_CURRENCY:
+            return 1.0
+        return self._rate(currency, when.toordinal(), *self._series(currency))
+
+    def to_eur(
+        self, amount: float, currency: str, when: t.Union[date, datetime]
+    ) -> float:
+        return amount / self.rate(currency, when)
+
+    def rates(
+        self, currencies: t.Sequence[str], dates: t.Sequence[t.Union[date, datetime]]
+    ) -> array:
+        """Rates for whole columns, grouped per currency to reuse each series."""
+        result = array("d", bytes(8 * len(dates)))
+        by_currency = {}
+        for index, currency in enumerate(currencies):
+            by_currency.setdefault(currency, []).append(index)
+        for currency, indexes in by_currency.items():
+            if currency == BASE_CURRENCY:
+                for index in indexes:
+                    result[index] = 1.0
+                continue
+            series = self._series(currency)
+            for index in indexes:
+                result[index] = self._rate(currency, dates[index].toordinal(), *series)
+        return result
+
+    def to_eur_many(
+        self,
+        amounts: t.Sequence[float],
+        currencies: t.Sequence[str],
+        dates: t.Sequence[t.Union[date, datetime]],
+    ) -> t.List[float]:
+        return [
+            amount / rate
+            for amount, rate in zip(amounts, self.rates(currencies, dates))
+        ]
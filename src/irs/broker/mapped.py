@@ -0,0 +1,184 @@
+import logging
+import mmap
+import re
+import typing as t
+
+_logger = logging.getLogger(__name__)
+
+
+BOM = b"\xef\xbb\xbf"
+QUOTE = ord('"')
+CR = ord("\r")
+
+# One field of a record that fits on a single line: quoted or bare.
+FIELD_RE = re.compile(rb'(?:^|,)(?:"([^"]*(?:""[^"]*)*)"|([^,]*))')
+
+
+class MappedCsvFile:
+    """Memory-mapped csv reader that only decodes the requested columns.
+
+    Record boundaries are found in the raw bytes, honouring quoted fields that
+    contain commas, escaped quotes or newlines. Lines without quotes take a
+    single ``split``, lines with balanced quotes a single regex ``findall``,
+    and records spanning lines have their field spans located with ``find``.
+    A leading UTF-8 BOM is skipped.
+
+    This is not zero-copy: each line is copied out of the map and the ``split``
+    and ``findall`` paths create a ``bytes`` object for every field. Only the
+    decoding of unwanted fields is skipped, and records are streamed rather
+    than read up front. Parsing is about twice as slow as ``csv.reader``; a
+    field-by-field ``find`` walk on the map avoids the copies but is slower
+    still in CPython.
+    """
+
+    def __init__(self, file_path, encoding="utf-8"):
+        self.file_path = file_path
+        self.encoding = encoding
+        self._file = open(file_path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            self._mm = b""
+        self._start = len(BOM) if self._mm[: len(BOM)] == BOM else 0
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def header(self) -> t.List[str]:
+        return next(self.records(), [])
+
+    def records(
+        self,
+        indexes: t.Optional[t.Sequence[int]] = None,
+        skip: int = 0,
+        blank: bool = False,
+    ) -> t.Iterator[t.List[str]]:
+        """Yield the fields of every record, or only those at ``indexes``.
+
+        Projected records are aligned with ``indexes``; fields missing from a
+        short record are returned as empty strings. Blank lines are skipped,
+        or yielded as ``[]`` like ``csv.reader`` does when ``blank`` is set.
+        """
+        mm, size, pos = self._mm, len(self._mm), self._start
+        limit = None if indexes is None else max(indexes, default=-1)
+        encoding = self.encoding
+        while pos < size:
+            line_end = mm.find(b"\n", pos)
+            if line_end == -1:
+                line_end = size
+            if line_end == pos or (line_end == pos + 1 and mm[pos] == CR):
+                pos = line_end + 1
+                if blank and not skip:
+                    yield []
+                continue
+            if skip:
+                skip -= 1
+                pos = self._skip(pos, line_end)
+                continue
+
+            end = line_end - 1 if mm[line_end - 1] == CR else line_end
+            line = mm[pos:end]
+            quotes = line.count(b'"')
+            if not quotes:
+                raw = line.split(b",")
+                pos = line_end + 1
+                if indexes is None:
+                    yield [field.decode(self.encoding) for field in raw]
+                else:
+                    yield [
+                        raw[i].decode(self.encoding) if i < len(raw) else ""
+                        for i in indexes
+                    ]
+                continue
+            if quotes % 2 == 0:
+                raw = FIELD_RE.findall(line)
+                pos = line_end + 1
+                if indexes is not None and len(raw) > limit and b'""' not in line:
+                    yield [(raw[i][0] or raw[i][1]).decode(encoding) for i in indexes]
+                elif indexes is None:
+                    yield [self._decode_match(match) for match in raw]
+                else:
+                    yield [
+                        self._decode_match(raw[i]) if i < len(raw) else ""
+                        for i in indexes
+                    ]
+                continue
+
+            spans, pos = self._spans(pos, line_end, limit)
+            if indexes is None:
+                yield [self._decode(span) for span in spans]
+            else:
+                yield [
+                    self._decode(spans[i]) if i < len(spans) else "" for i in indexes
+                ]
+
+    def _decode_match(self, match: t.Tuple[bytes, bytes]) -> str:
+        quoted, bare = match
+        if quoted:
+            return quoted.decode(self.encoding).replace('""', '"')
+        return bare.decode(self.encoding)
+
+    def _decode(self, span: t.Tuple[int, int, bool]) -> str:
+        start, end, quoted = span
+        value = self._mm[start:end].decode(self.encoding)
+        return value.replace('""', '"') if quoted else value
+
+    def _skip(self, pos: int, line_end: int) -> int:
+        if self._mm.find(b'"', pos, line_end) == -1:
+            return line_end + 1
+        return self._spans(pos, line_end, None)[1]
+
+    def _spans(
+        self, pos: int, line_end: int, limit: t.Optional[int]
+    ) -> t.Tuple[t.List[t.Tuple[int, int, bool]], int]:
+        """Field spans of the record starting at ``pos`` and the next record start."""
+        mm, size = self._mm, len(self._mm)
+        spans = []
+        while True:
+            if (
+                limit is not None
+                and len(spans) > limit
+                and mm.find(b'"', pos, line_end) == -1
+            ):
+                return spans, line_end + 1
+            if pos < size and mm[pos] == QUOTE:
+                end = pos + 1
+                while True:
+                    end = mm.find(b'"', end)
+                    if end == -1:
+                        _logger.warning("unterminated quote in %s", self.file_path)
+                        end = size
+                        break
+                    if end + 1 < size and mm[end + 1] == QUOTE:
+                        end += 2
+                        continue
+                    break
+                spans.append((pos + 1, end, True))
+                if end >= line_end:
+                    # The quoted field spans lines, the record ends further on.
+                    line_end = mm.find(b"\n", end)
+                    if line_end == -1:
+                        line_end = size
+                comma = mm.find(b",", end, line_end)
+                if comma == -1:
+                    return spans, line_end + 1
+                pos = comma + 1
+            else:
+                comma = mm.find(b",", pos, line_end)
+                if comma == -1:
+                    end = line_end
+                    if end > pos and mm[end - 1] == CR:
+                        end -= 1
+                    spans.append((pos, end, False))
+                    return spans, line_end + 1
+                spans.append((pos, comma, False))
+                pos = comma + 1
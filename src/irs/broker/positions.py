@@ -0,0 +1,150 @@
+import itertools
+import logging
+import typing as t
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime
+
+import attr
+import attrs
+
+_logger = logging.getLogger(__name__)
+
+
+@attrs.define
+class Lot:
+    """Units of a buy order still open at the query date (FIFO)."""
+
+    date: datetime
+    unit: int
+    unit_cost: float
+
+    @property
+    def cost(self):
+        return self.unit * self.unit_cost
+
+
+@attrs.define
+class Position:
+    isin: str
+    name: str
+    unit: int = 0
+    realized: float = 0.0
+    lots: t.List[Lot] = attr.ib(factory=list)
+
+    @property
+    def cost(self):
+        return sum(lot.cost for lot in self.lots)
+
+
+def _cumulative(typecode, values) -> array:
+    return array(typecode, itertools.accumulate(values))
+
+
+@attrs.define
+class ProductSeries:
+    """Per-ISIN cumulative arrays sorted by date ordinal.
+
+    ``unit_*`` follows every order, ``buy_*`` and ``sell_*`` the orders used for
+    FIFO matching and ``gain_*`` the realized gain of each matched sale.
+    """
+
+    isin: str
+    name: str
+    unit_dates: array
+    unit_total: array
+    buy_dates: array
+    buy_total: array
+    buy_orders: t.List
+    sell_dates: array
+    sell_total: array
+    gain_dates: array
+    gain_total: array
+
+    @classmethod
+    def from_product(cls, product) -> "ProductSeries":
+        orders = sorted(product.order_history)
+        buy_orders = product.buy_orders
+        sell_orders = product.sell_orders
+        records = product.declare()
+        return cls(
+            isin=product.isin,
+            name=product.name,
+            unit_dates=array("l", (o.date.toordinal() for o in orders)),
+            unit_total=_cumulative("q", (o.unit for o in orders)),
+            buy_dates=array("l", (o.date.toordinal() for o in buy_orders)),
+            buy_total=_cumulative("q", (o.unit for o in buy_orders)),
+            buy_orders=buy_orders,
+            sell_dates=array("l", (o.date.toordinal() for o in sell_orders)),
+            sell_total=_cumulative("q", (abs(o.unit) for o in sell_orders)),
+            gain_dates=array("l", (r["realization_date"].toordinal() for r in records)),
+            gain_total=_cumulative(
+                "d",
+                (
+                    r["realization_value"] - r["acquisition_value"] - r["expenses"]
+                    for r in records
+                ),
+            ),
+        )
+
+    @staticmethod
+    def _at(dates: array, totals: array, day: int, default=0):
+        index = bisect_right(dates, day) - 1
+        return totals[index] if index >= 0 else default
+
+    def position(self, when: t.Union[date, datetime], lots=True) -> Position:
+        day = when.toordinal()
+        position = Position(
+            isin=self.isin,
+            name=self.name,
+            unit=self._at(self.unit_dates, self.unit_total, day),
+            realized=self._at(self.gain_dates, self.gain_total, day, default=0.0),
+        )
+        if lots:
+            bought = bisect_right(self.buy_dates, day)
+            sold = self._at(self.sell_dates, self.sell_total, day)
+            first = bisect_right(self.buy_total, sold, 0, bought)
+            for index in range(first, bought):
+                order = self.buy_orders[index]
+                unit = self.buy_total[index] - max(
+                    sold, self.buy_total[index - 1] if index else 0
+                )
+                position.lots.append(
+                    Lot(date=order.date, unit=unit, unit_cost=abs(order.unit_value))
+                )
+        return position
+
+
+@attrs.define
+class PositionIndex:
+    """Point-in-time positions, open lots and realized gains of a portfolio.
+
+    Each query is a binary search per instrument over arrays built once from
+    the order history, so many dates can be reconciled without reloading.
+    """
+
+    series: t.Dict[str, ProductSeries] = attr.ib(factory=dict)
+
+    @classmethod
+    def from_portfolio(cls, portfolio) -> "PositionIndex":
+        return cls(
+            series={
+                product.isin: ProductSeries.from_product(product)
+                for product in portfolio.products
+            }
+        )
+
+    def position(self, isin: str, when: t.Union[date, datetime], lots=True):
+        if isin not in self.series:
+            raise LookupError(f"no product {isin}")
+        return self.series[isin].position(when, lots=lots)
+
+    def positions(
+        self, when: t.Union[date, datetime], lots=True, include_closed=False
+    ) -> t.List[Position]:
+        positions = [
+            series.position(when, lots=lots) for series in self.series.values()
+        ]
+        if not include_closed:
+            positions = [p for p in positions if p.unit or p.realized]
+        return sorted(positions, key=lambda p: p.name.lower())
@@ -1,12 +1,19 @@
+import json
 import logging
+import sys
 import typing as t
 import xml.etree.ElementTree as ET
 import pathlib
-from datetime import datetime
+from datetime import date, datetime
 from irs.broker.degiro import Portfolio
-from irs.model.model import IRS
+from irs.broker.fx import FxRates
+from irs.model import schema
+from irs.model.model import IRS, CapitalGains, Quadro09Totals
+from irs.service import server, watch
 
 import argparse
+import attrs
+from tabulate import tabulate
 
 # Configure logging for all modules
 logging.basicConfig(
@@ -27,56 +34,377 @@ def create_xml(data, output_file):
     tree.write(output_file)
 
 
-def parse_arguments():
-    parser = argparse.ArgumentParser(description="A simple argument parser example")
+def _default(value, subcommand):
+    # Subcommand copies of top-level options leave the attribute unset when
+    # omitted, so a value given before the subcommand is not overwritten.
+    return argparse.SUPPRESS if subcommand else value
 
-    # Add arguments
+
+def add_data_arguments(parser, required=True):
+    parser.add_argument(
+        "-d",
+        "--data",
+        type=pathlib.Path,
+        required=required,
+        help="Transaction data from brokers",
+    )
+    parser.add_argument(
+        "-t",
+        "--tax-id",
+        type=str,
+        required=required,
+        help="Tax identification number (NIF)",
+    )
+
+
+def add_declaration_arguments(parser, required=True, subcommand=False):
     parser.add_argument(
         "-i",
         "--input",
         type=pathlib.Path,
-        required=True,
+        required=required,
         help="Path to the pre-filled irs declaration xml file",
     )
+    add_data_arguments(parser, required=required)
     parser.add_argument(
-        "-d",
-        "--data",
+        "-o",
+        "--output",
         type=pathlib.Path,
-        required=True,
-        help="Transaction data from brokers",
-    )
-    parser.add_argument(
-        "-o", "--output", type=pathlib.Path, default="output/output.xml"
+        default=_default("output/output.xml", subcommand),
     )
     parser.add_argument(
         "-y",
         "--year",
         type=int,
-        default=datetime.now().year - 1,
+        default=_default(datetime.now().year - 1, subcommand),
         help="Fiscal year for the declaration (default: previous year)",
     )
+    add_ingest_arguments(parser, subcommand=subcommand)
+    add_schema_argument(parser, subcommand=subcommand)
+
+
+def add_schema_argument(parser, subcommand=False):
     parser.add_argument(
-        "-t",
-        "--tax-id",
-        type=str,
+        "--schema-dir",
+        type=pathlib.Path,
+        default=_default(None, subcommand),
+        help="Directory with the Modelo3IRSv<year>.xsd files to validate the output",
+    )
+
+
+def add_ingest_arguments(parser, subcommand=False):
+    parser.add_argument(
+        "--fx-rates",
+        type=pathlib.Path,
+        default=_default(None, subcommand),
+        help="ECB reference rate csv file or directory, converts non-EUR trades",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        default=_default(False, subcommand),
+        help="Memory-map broker csv files and decode only the columns in use",
+    )
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="A simple argument parser example")
+
+    # Add arguments
+    add_declaration_arguments(parser, required=False)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only compute the Quadro09 totals and line count, diffed against "
+        "the input declaration when one is given",
+    )
+    parser.add_argument(
+        "--json",
+        dest="check_json",
+        action="store_true",
+        help="Print the --check report as JSON",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser(
+        "serve", help="Run a local declaration service with warm caches"
+    )
+    serve_parser.add_argument(
+        "-d",
+        "--data",
+        type=pathlib.Path,
         required=True,
-        help="Tax identification number (NIF)",
+        help="Transaction data from brokers, one directory per NIF",
+    )
+    serve_parser.add_argument(
+        "--templates",
+        type=pathlib.Path,
+        help="Directory the /export input templates are read from "
+        "(default: the data directory)",
+    )
+    serve_parser.add_argument("--host", type=str, default=server.DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=server.DEFAULT_PORT)
+    serve_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=32,
+        help="Number of portfolios and templates kept in memory (default: 32)",
+    )
+    add_ingest_arguments(serve_parser, subcommand=True)
+    add_schema_argument(serve_parser, subcommand=True)
+    watch_parser = subparsers.add_parser(
+        "watch", help="Rewrite the declaration whenever broker exports change"
+    )
+    add_declaration_arguments(watch_parser, subcommand=True)
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Polling interval in seconds (default: 1.0)",
+    )
+
+    positions_parser = subparsers.add_parser(
+        "positions", help="Positions, open lots and realized gains as of dates"
+    )
+    add_data_arguments(positions_parser)
+    positions_parser.add_argument(
+        "--date",
+        dest="dates",
+        type=date.fromisoformat,
+        action="append",
+        required=True,
+        help="Date (YYYY-MM-DD) to report, may be repeated",
     )
+    positions_parser.add_argument(
+        "--isin", action="append", help="Only report these ISINs, may be repeated"
+    )
+    positions_parser.add_argument(
+        "--lots", action="store_true", help="Also list the open lots (FIFO)"
+    )
+    positions_parser.add_argument(
+        "--json", action="store_true", help="Print the report as JSON"
+    )
+    add_ingest_arguments(positions_parser, subcommand=True)
+
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        missing = [
+            option
+            for option, value in (
+                ("-i/--input", args.input if not args.check else True),
+                ("-d/--data", args.data),
+                ("-t/--tax-id", args.tax_id),
+            )
+            if value is None
+        ]
+        if missing:
+            parser.error(f"the following arguments are required: {', '.join(missing)}")
+        if args.check_json and not args.check:
+            parser.error("--json requires --check")
+    else:
+        for option, value in (("--check", args.check), ("--json", args.check_json)):
+            if value:
+                parser.error(f"{option} cannot be combined with {args.command}")
+    if getattr(args, "schema_dir", None) is not None and not args.schema_dir.is_dir():
+        parser.error(f"--schema-dir {args.schema_dir} is not a directory")
     return args
 
 
-def main():
-    args = parse_arguments()
+def _format_total(value):
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def check(sales, fiscal_year, declaration=None, as_json=False) -> bool:
+    """Report the per-year Quadro09 totals, return False on a mismatch."""
+    totals = CapitalGains.totals(sales)
+    report = {str(year): total.as_dict() for year, total in totals.items()}
+    diff = {}
+    if declaration is not None:
+        expected = IRS.read_totals(declaration).as_dict()
+        computed = totals.get(fiscal_year, Quadro09Totals()).as_dict()
+        diff = {
+            key: dict(declared=expected[key], computed=computed[key])
+            for key in computed
+            if round(computed[key] - expected[key], 2) != 0
+        }
+
+    if as_json:
+        print(json.dumps(dict(years=report, fiscal_year=fiscal_year, diff=diff)))
+    else:
+        headers = ["Year", "Lines", "SomaC01", "SomaC02", "SomaC03", "SomaC04"]
+        print(
+            tabulate(
+                [
+                    (year, *(_format_total(value) for value in row.values()))
+                    for year, row in report.items()
+                ],
+                headers,
+                tablefmt="pretty",
+            )
+        )
+        if declaration is not None:
+            if diff:
+                print(f"\n{declaration} differs for {fiscal_year}:")
+                print(
+                    tabulate(
+                        [
+                            (
+                                key,
+                                _format_total(value["declared"]),
+                                _format_total(value["computed"]),
+                            )
+                            for key, value in diff.items()
+                        ],
+                        ["Field", "Declared", "Computed"],
+                        tablefmt="pretty",
+                    )
+                )
+            else:
+                print(f"\n{declaration} matches for {fiscal_year}.")
+    return not diff
+
+
+def report_positions(index, dates, isins=None, lots=False, as_json=False):
+    report = {}
+    for when in dates:
+        if isins:
+            positions = [index.position(isin, when, lots=lots) for isin in isins]
+        else:
+            positions = index.positions(when, lots=lots)
+        report[when.isoformat()] = positions
+
+    if as_json:
+        print(
+            json.dumps(
+                {
+                    when: [_position_json(p) for p in positions]
+                    for when, positions in report.items()
+                }
+            )
+        )
+        return
+
+    for when, positions in report.items():
+        print(f"\nPositions as of {when}:")
+        print(
+            tabulate(
+                [
+                    (p.name, p.isin, p.unit, f"{p.cost:.2f}", f"{p.realized:.2f}")
+                    for p in positions
+                ],
+                ["Product", "ISIN", "Unit", "Cost", "Realized"],
+                tablefmt="pretty",
+                colalign=("left", "center", "right", "right", "right"),
+            )
+        )
+        if lots:
+            print(
+                tabulate(
+                    [
+                        (p.name, lot.date.date(), lot.unit, f"{lot.unit_cost:.4f}")
+                        for p in positions
+                        for lot in p.lots
+                    ],
+                    ["Product", "Bought", "Unit", "Unit cost"],
+                    tablefmt="pretty",
+                    colalign=("left", "center", "right", "right"),
+                )
+            )
+
+
+def _position_json(position) -> dict:
+    # attrs.asdict only walks fields, the cost properties are added explicitly.
+    data = attrs.asdict(position, value_serializer=_serialize)
+    data["cost"] = position.cost
+    for lot, lot_data in zip(position.lots, data["lots"]):
+        lot_data["cost"] = lot.cost
+    return data
+
+
+def _serialize(inst, field, value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def load_template_schema(file, schema_dir):
+    """Compile the XSD for a declaration template up front, exit on failure."""
+    try:
+        return schema.declaration_schema(ET.parse(str(file)).getroot(), schema_dir)
+    except (OSError, ET.ParseError, schema.SchemaLoadError) as e:
+        _logger.error("%s", e)
+        sys.exit(1)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    fx = FxRates.from_csv_files(args.fx_rates) if args.fx_rates else None
+    if args.command == "serve":
+        server.serve(
+            args.data,
+            host=args.host,
+            port=args.port,
+            cache_size=args.cache_size,
+            fx=fx,
+            mapped=args.mmap,
+            schema_dir=args.schema_dir,
+            templates_dir=args.templates,
+        )
+        return
     data_dir = f'{args.data}/{args.tax_id}'
-    portfolio = Portfolio.from_transaction_csv_files(input_dir=data_dir)
+    if args.command == "positions":
+        portfolio = Portfolio.from_transaction_csv_files(
+            input_dir=data_dir, fx=fx, mapped=args.mmap
+        )
+        index = portfolio.position_index()
+        if unknown := [isin for isin in args.isin or () if isin not in index.series]:
+            _logger.error("no transactions for ISIN %s", ", ".join(unknown))
+            sys.exit(1)
+        report_positions(
+            index,
+            args.dates,
+            isins=args.isin,
+            lots=args.lots,
+            as_json=args.json,
+        )
+        return
+    if args.schema_dir is not None and not args.check:
+        load_template_schema(args.input, args.schema_dir)
+    if args.command == "watch":
+        watch.watch(
+            data_dir,
+            args.input,
+            args.output,
+            fiscal_year=args.year,
+            interval=args.interval,
+            fx=fx,
+            mapped=args.mmap,
+            schema_dir=args.schema_dir,
+        )
+        return
+    portfolio = Portfolio.from_transaction_csv_files(
+        input_dir=data_dir, fx=fx, mapped=args.mmap
+    )
+    if args.check:
+        sales, _ = portfolio.declare()
+        if not check(sales, args.year, declaration=args.input, as_json=args.check_json):
+            sys.exit(1)
+        return
     portfolio.summary()
     sales, _ = portfolio.declare()
     irs = IRS()
     irs.load(args.input)
     irs.declare(sales, fiscal_year=args.year)
-    irs.export(args.output)
+    body = irs.tostring()
+    if args.schema_dir is not None:
+        # Validate the serialized declaration once, an invalid one is not written.
+        errors = schema.validate(body, args.schema_dir)
+        for error in errors:
+            _logger.error("%s %s", args.output, error)
+        if errors:
+            sys.exit(1)
+    pathlib.Path(args.output).write_bytes(body)
 
 
 if __name__ == "__main__":
@@ -86,6 +86,32 @@ class SaleRecord:
         return self._code
 
 
+@attrs.define
+class Quadro09Totals:
+    """Line count and AnexoJq092AT01SomaC01..C04 of one fiscal year."""
+
+    lines: int = 0
+    soma_c01: float = 0.0
+    soma_c02: float = 0.0
+    soma_c03: float = 0.0
+    soma_c04: float = 0.0
+
+    def add(self, realization_value, acquisition_value, expenses):
+        self.lines += 1
+        self.soma_c01 += round(realization_value, 2)
+        self.soma_c02 += round(acquisition_value, 2)
+        self.soma_c03 += round(expenses, 2)
+
+    def as_dict(self) -> dict:
+        return dict(
+            lines=self.lines,
+            soma_c01=round(self.soma_c01, 2),
+            soma_c02=round(self.soma_c02, 2),
+            soma_c03=round(self.soma_c03, 2),
+            soma_c04=round(self.soma_c04, 2),
+        )
+
+
 @attrs.define
 class CapitalGains:
     """9.2 Incrementos Patrimoniais de Opção de Englobamento"""
@@ -130,10 +156,19 @@ class CapitalGains:
             line.coutry_of_counterparty
         )
 
+    @staticmethod
+    def totals(sales) -> t.Dict[int, Quadro09Totals]:
+        """Per fiscal year totals of the sale records, without building any XML."""
+        totals = {}
+        for sale in sales:
+            year = sale["realization_date"].year
+            totals.setdefault(year, Quadro09Totals()).add(
+                sale["realization_value"], sale["acquisition_value"], sale["expenses"]
+            )
+        return dict(sorted(totals.items()))
+
     def declare(self, sales, fiscal_year, xml_root):
-        total_realization = 0.0
-        total_acquisition = 0.0
-        total_expenses = 0.0
+        totals = Quadro09Totals()
 
         quadro09 = self._get_or_create(xml_root, f"{XML_NS}Quadro09")
         q092AT01 = self._get_or_create(quadro09, f"{XML_NS}AnexoJq092AT01")
@@ -142,24 +177,24 @@ class CapitalGains:
             line.linha += index
             if line.realization_date.year == fiscal_year:
                 self.generate_content(q092AT01, XML_NS, line)
-                total_realization += round(line.realization_value, 2)
-                total_acquisition += round(line.acquisition_value, 2)
-                total_expenses += round(line.expenses, 2)
+                totals.add(
+                    line.realization_value, line.acquisition_value, line.expenses
+                )
 
         # Add the sum elements as siblings to AnexoJq092AT01
 
         # Create sum elements
         sum_c01 = ET.SubElement(quadro09, f"{XML_NS}AnexoJq092AT01SomaC01")
-        sum_c01.text = f"{total_realization:.2f}"
+        sum_c01.text = f"{totals.soma_c01:.2f}"
 
         sum_c02 = ET.SubElement(quadro09, f"{XML_NS}AnexoJq092AT01SomaC02")
-        sum_c02.text = f"{total_acquisition:.2f}"
+        sum_c02.text = f"{totals.soma_c02:.2f}"
 
         sum_c03 = ET.SubElement(quadro09, f"{XML_NS}AnexoJq092AT01SomaC03")
-        sum_c03.text = f"{total_expenses:.2f}"
+        sum_c03.text = f"{totals.soma_c03:.2f}"
 
         sum_c04 = ET.SubElement(quadro09, f"{XML_NS}AnexoJq092AT01SomaC04")
-        sum_c04.text = f"{0:.2f}"
+        sum_c04.text = f"{totals.soma_c04:.2f}"
 
 
 @attrs.define
@@ -197,13 +232,32 @@ class IRS:
 
     def load(self, file: pathlib.Path):
         tree = ET.parse(str(file))
-        self.root = tree.getroot()
+        self.load_root(tree.getroot())
+
+    @staticmethod
+    def read_totals(file: pathlib.Path) -> Quadro09Totals:
+        """Quadro09 line count and sums already present in a declaration."""
+        totals = Quadro09Totals()
+        for _, elem in ET.iterparse(str(file)):
+            name = elem.tag.rsplit("}", 1)[-1]
+            if name == "AnexoJq092AT01-Linha":
+                totals.lines += 1
+                elem.clear()
+            elif name.startswith("AnexoJq092AT01SomaC0"):
+                field = f"soma_c0{name[-1]}"
+                if hasattr(totals, field) and elem.text:
+                    setattr(totals, field, float(elem.text))
+        return totals
+
+    def load_root(self, root: ET.Element):
+        """Use an already parsed declaration, e.g. a cached template copy."""
+        self.root = root
         if self.root.tag.startswith("{"):
             namespace_uri = self.root.tag.split("}", 1)[0][1:]
             global XML_NS
             XML_NS = f"{{{namespace_uri}}}"
 
-    def export(self, output):
+    def tostring(self) -> bytes:
         # Register the default namespace without a prefix
         ET.register_namespace("", XML_NS.strip("{}"))
         tree = ET.ElementTree(self.root)
@@ -217,10 +271,11 @@ class IRS:
         root = etree.fromstring(xml_string, parser)
         etree.indent(root, space="")
 
-        # Write with lxml which handles empty elements better
+        # Serialize with lxml which handles empty elements better
+        return etree.tostring(
+            root, encoding="utf-8", xml_declaration=True, pretty_print=True
+        )
+
+    def export(self, output):
         with open(output, "wb") as f:
-            f.write(
-                etree.tostring(
-                    root, encoding="utf-8", xml_declaration=True, pretty_print=True
-                )
-            )
+            f.write(self.tostring())
@@ -0,0 +1,86 @@
+import logging
+import os
+import pathlib
+import typing as t
+
+import attrs
+from lxml import etree
+
+from irs.model.model import YEAR_NS_MAP
+
+_logger = logging.getLogger(__name__)
+
+
+@attrs.define
+class SchemaError:
+    """One validation failure, located in the file and in the AnexoJ lines."""
+
+    line: int
+    message: str
+    linha: t.Optional[int] = None
+
+    def __str__(self) -> str:
+        where = f"line {self.line}"
+        if self.linha is not None:
+            where += f" (AnexoJq092AT01-Linha {self.linha})"
+        return f"{where}: {self.message}"
+
+
+class SchemaLoadError(RuntimeError):
+    """The XSD for a declaration is unknown, missing or does not compile."""
+
+
+def schema_path(schema_dir, namespace: str) -> pathlib.Path:
+    """Local copy of the Modelo3IRS XSD for a ``YEAR_NS_MAP`` namespace."""
+    for year, year_ns in YEAR_NS_MAP.items():
+        if year_ns == namespace:
+            return pathlib.Path(schema_dir) / f"Modelo3IRSv{year}.xsd"
+    raise SchemaLoadError(f"unknown declaration namespace {namespace}")
+
+
+# Latest compilation of each xsd path with the mtime it was compiled at.
+_compiled: t.Dict[str, t.Tuple[int, etree.XMLSchema]] = {}
+
+
+def load_schema(path) -> etree.XMLSchema:
+    """Compiled schema, reused in-process until the xsd file changes."""
+    path = os.path.abspath(path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        entry = _compiled.get(path)
+        if entry is None or entry[0] != mtime_ns:
+            _logger.debug("compiling schema %s", path)
+            entry = mtime_ns, etree.XMLSchema(etree.parse(path))
+            _compiled[path] = entry
+    except (OSError, etree.XMLSyntaxError, etree.XMLSchemaParseError) as e:
+        raise SchemaLoadError(f"cannot load schema {path}: {e}") from e
+    return entry[1]
+
+
+def declaration_schema(root, schema_dir) -> etree.XMLSchema:
+    """Compiled XSD for a declaration root, either an lxml or ElementTree element."""
+    return load_schema(schema_path(schema_dir, etree.QName(root.tag).namespace))
+
+
+def validate(source, schema_dir) -> t.List[SchemaError]:
+    """Validate a declaration, given as bytes or a file path, against its XSD."""
+    if isinstance(source, bytes):
+        root = etree.fromstring(source)
+    else:
+        root = etree.parse(str(source)).getroot()
+    namespace = etree.QName(root).namespace
+    schema = declaration_schema(root, schema_dir)
+    if schema.validate(root):
+        return []
+
+    linhas = {}
+    for linha in root.iter(f"{{{namespace}}}AnexoJq092AT01-Linha"):
+        numero = linha.get("numero")
+        for elem in linha.iter():
+            linhas[elem.sourceline] = int(numero) if numero else None
+    return [
+        SchemaError(
+            line=error.line, message=error.message, linha=linhas.get(error.line)
+        )
+        for error in schema.error_log
+    ]
@@ -0,0 +1,19 @@
+import typing as t
+
+CURRENCY_SYMBOLS = {"$": "USD", "¥": "JPY"}
+
+
+def quote_currency(row: t.NamedTuple) -> str:
+    """Currency of a Plus500 closed position, the quote side of its rate.
+
+    ``Exchange_Rate`` reads "EUR/USD 1.0856"; the currency is checked against
+    the symbol prefixing ``Open_Value`` when there is one.
+    """
+    currency = row.Exchange_Rate.split(" ")[0].split("/")[-1]
+    symbol_currency = CURRENCY_SYMBOLS.get(row.Open_Value[:1])
+    if currency == "EUR" or (symbol_currency and symbol_currency != currency):
+        raise RuntimeError(
+            f"cannot tell the currency of {row.Instrument}: "
+            f"{row.Exchange_Rate!r}, {row.Open_Value!r}"
+        )
+    return currency
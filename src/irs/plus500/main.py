@@ -1,4 +1,3 @@
-import csv
 from collections import namedtuple
 from datetime import datetime
 import xml.etree.ElementTree as ET
@@ -6,6 +5,10 @@ import xml.dom.minidom
 import os
 import attr
 
+from irs.broker.fx import FxRates
+from irs.broker.mapped import MappedCsvFile
+from irs.plus500.currency import quote_currency
+
 
 @attr.define
 class Line:
@@ -51,8 +54,14 @@ Stock = {
 }
 
 
-with open("data/284318760/book.csv", "r") as f:
-    reader = csv.reader(f)
+# Optional ECB reference rates, converts each leg at its own trade-date rate.
+FX_RATES_DIR = "data/fx"
+fx = FxRates.from_csv_files(FX_RATES_DIR) if os.path.isdir(FX_RATES_DIR) else None
+
+
+with MappedCsvFile("data/284318760/book.csv") as f:
+    # Blank lines still count towards the i % 3 merge below, as with csv.reader.
+    reader = f.records(blank=True)
     headers = []  # get the first 3 line
     headers.extend(next(reader))
     headers.extend(next(reader))
@@ -95,19 +104,25 @@ with open("data/284318760/book.csv", "r") as f:
             pais_do_fonte = "392"  # Japao
         if row.Open_Value == row.Close_Value:
             continue
+        open_date = datetime.strptime(row.Open_Time, "%m/%d/%Y %H:%M").date()
+        close_date = datetime.strptime(row.Close_Time, "%m/%d/%Y %H:%M").date()
+
         if row.Exchange_Rate == "EUR/EUR --":
             pais_do_fonte = Stock[row.Instrument]
-            exchange = 1
+            open_exchange = close_exchange = 1
+        elif fx is not None:
+            currency = quote_currency(row)
+            open_exchange = fx.rate(currency, open_date)
+            close_exchange = fx.rate(currency, close_date)
         else:
             # print(row)
             # print(row.Exchange_Rate)
-            exchange = float(row.Exchange_Rate.split(" ")[1])
+            open_exchange = close_exchange = float(row.Exchange_Rate.split(" ")[1])
 
-        open_date = datetime.strptime(row.Open_Time, "%m/%d/%Y %H:%M").date()
-        close_date = datetime.strptime(row.Close_Time, "%m/%d/%Y %H:%M").date()
-
-        open_value = float(row.Open_Value[1:].replace(",", "").strip()) / exchange
-        close_value = float(row.Close_Value[1:].replace(",", "").strip()) / exchange
+        open_value = float(row.Open_Value[1:].replace(",", "").strip()) / open_exchange
+        close_value = (
+            float(row.Close_Value[1:].replace(",", "").strip()) / close_exchange
+        )
         if row.Buy_Sell == "Buy":
             profit = close_value - open_value
 
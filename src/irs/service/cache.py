@@ -0,0 +1,53 @@
+import glob
+import logging
+import os
+import typing as t
+from collections import OrderedDict
+
+import attr
+import attrs
+
+_logger = logging.getLogger(__name__)
+
+
+def file_signature(file_path) -> t.Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def dir_signature(input_dir, pattern="*.csv") -> t.Tuple:
+    """Signature of the matching files, changes when one is added, removed or edited."""
+    return tuple(
+        (os.path.basename(file_path), *file_signature(file_path))
+        for file_path in sorted(glob.glob(os.path.join(input_dir, pattern)))
+    )
+
+
+@attrs.define
+class LRUCache:
+    """Least recently used cache whose entries are invalidated by a file signature."""
+
+    maxsize: int = 32
+    hits: int = 0
+    misses: int = 0
+    _entries: OrderedDict = attr.ib(factory=OrderedDict, init=False, repr=False)
+
+    def get(self, key, signature, loader: t.Callable[[], t.Any]):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        _logger.debug("cache miss for %s", key)
+        value = loader()
+        self._entries[key] = (signature, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            _logger.debug("evicted %s from cache", evicted)
+        return value
+
+    def __len__(self):
+        return len(self._entries)
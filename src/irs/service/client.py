@@ -0,0 +1,44 @@
+import json
+import pathlib
+import typing as t
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import attrs
+
+from irs.service.server import DEFAULT_HOST, DEFAULT_PORT
+
+
+@attrs.define
+class Client:
+    """Minimal client for a running ``irs serve`` instance."""
+
+    base_url: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+    timeout: float = 30.0
+
+    def _get(self, endpoint: str, **params) -> bytes:
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        with urlopen(
+            f"{self.base_url}{endpoint}?{query}", timeout=self.timeout
+        ) as resp:
+            return resp.read()
+
+    def summary(self, nif: str) -> dict:
+        return json.loads(self._get("/summary", nif=nif))
+
+    def declare(self, nif: str, fiscal_year: t.Optional[int] = None) -> dict:
+        return json.loads(self._get("/declare", nif=nif, year=fiscal_year))
+
+    def export(
+        self,
+        nif: str,
+        file: pathlib.Path,
+        fiscal_year: int,
+        output: t.Optional[pathlib.Path] = None,
+    ) -> bytes:
+        # A declaration failing schema validation is answered with HTTP 422.
+        body = self._get("/export", nif=nif, input=str(file), year=fiscal_year)
+        if output is not None:
+            with open(output, "wb") as f:
+                f.write(body)
+        return body
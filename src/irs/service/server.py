@@ -0,0 +1,244 @@
+import copy
+import json
+import logging
+import pathlib
+import typing as t
+import xml.etree.ElementTree as ET
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import attr
+import attrs
+
+from irs.broker.degiro import Portfolio
+from irs.broker.fx import FxRates
+from irs.model import schema
+from irs.model.model import IRS
+from irs.service.cache import LRUCache, dir_signature, file_signature
+
+_logger = logging.getLogger(__name__)
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8750
+
+
+class NotFoundError(Exception):
+    """No transaction data or declaration template for the request."""
+
+
+class BadRequestError(Exception):
+    """Missing or malformed query parameter."""
+
+
+def _jsonable(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+@attrs.define
+class DeclarationService:
+    """Keeps parsed portfolios and declaration templates warm between requests.
+
+    Portfolios are keyed by NIF and invalidated when any csv file in
+    ``data_dir/<nif>`` changes, templates are keyed by path and invalidated on
+    their own mtime. Templates are only read from inside ``templates_dir``,
+    the data directory unless given.
+    """
+
+    data_dir: pathlib.Path
+    cache_size: int = 32
+    fx: t.Optional[FxRates] = None
+    mapped: bool = False
+    schema_dir: t.Optional[pathlib.Path] = None
+    templates_dir: t.Optional[pathlib.Path] = None
+    portfolios: LRUCache = attr.ib(init=False)
+    templates: LRUCache = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        self.data_dir = pathlib.Path(self.data_dir).resolve()
+        self.templates_dir = pathlib.Path(self.templates_dir or self.data_dir).resolve()
+        self.portfolios = LRUCache(maxsize=self.cache_size)
+        self.templates = LRUCache(maxsize=self.cache_size)
+
+    def _input_dir(self, nif: str) -> pathlib.Path:
+        input_dir = (self.data_dir / nif).resolve()
+        if input_dir.parent != self.data_dir or not input_dir.is_dir():
+            raise NotFoundError(f"no transaction data for {nif}")
+        return input_dir
+
+    def portfolio(self, nif: str) -> t.Tuple[Portfolio, t.List[dict]]:
+        input_dir = self._input_dir(nif)
+
+        def loader():
+            portfolio = Portfolio.from_transaction_csv_files(
+                input_dir=input_dir, fx=self.fx, mapped=self.mapped
+            )
+            sales, _ = portfolio.declare()
+            return portfolio, sales
+
+        return self.portfolios.get(str(input_dir), dir_signature(input_dir), loader)
+
+    def template(self, file: pathlib.Path) -> ET.Element:
+        path = (self.templates_dir / file).resolve()
+        if not path.is_relative_to(self.templates_dir) or not path.is_file():
+            raise NotFoundError(f"no declaration template {file}")
+        return self.templates.get(
+            str(path), file_signature(path), lambda: ET.parse(str(path)).getroot()
+        )
+
+    def summary(self, nif: str) -> dict:
+        portfolio, sales = self.portfolio(nif)
+        return dict(
+            nif=nif,
+            products=[
+                dict(
+                    isin=prod.isin,
+                    name=prod.name,
+                    unit=prod.unit,
+                    orders=len(prod.order_history),
+                )
+                for prod in portfolio.products
+            ],
+            open_positions=[
+                dict(isin=prod.isin, name=prod.name, unit=prod.unit)
+                for prod in portfolio.products
+                if prod.unit > 0
+            ],
+            sales=len(sales),
+        )
+
+    def declare(self, nif: str, fiscal_year: t.Optional[int] = None) -> dict:
+        _, sales = self.portfolio(nif)
+        records = []
+        for index, sale in enumerate(sales):
+            if fiscal_year is not None and sale["realization_date"].year != fiscal_year:
+                continue
+            record = {key: _jsonable(value) for key, value in sale.items()}
+            record["linha"] = 951 + index
+            records.append(record)
+        return dict(nif=nif, fiscal_year=fiscal_year, records=records)
+
+    def export(self, nif: str, file: pathlib.Path, fiscal_year: int) -> bytes:
+        _, sales = self.portfolio(nif)
+        template = self.template(file)
+        if self.schema_dir is not None:
+            schema.declaration_schema(template, self.schema_dir)
+        irs = IRS()
+        irs.load_root(copy.deepcopy(template))
+        irs.declare(sales, fiscal_year=fiscal_year)
+        return irs.tostring()
+
+    def validate(self, declaration: bytes) -> t.List[schema.SchemaError]:
+        if self.schema_dir is None:
+            return []
+        return schema.validate(declaration, self.schema_dir)
+
+
+class DeclarationRequestHandler(BaseHTTPRequestHandler):
+    """Routes ``/summary``, ``/declare`` and ``/export`` to the service."""
+
+    server: "DeclarationServer"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        service = self.server.service
+        try:
+            if url.path not in ("/summary", "/declare", "/export"):
+                raise NotFoundError(f"unknown endpoint {url.path}")
+            nif = self._require(query, "nif")
+            if url.path == "/summary":
+                self._send_json(service.summary(nif))
+            elif url.path == "/declare":
+                year = self._int(query["year"], "year") if "year" in query else None
+                self._send_json(service.declare(nif, fiscal_year=year))
+            else:
+                file = pathlib.Path(self._require(query, "input"))
+                year = self._int(self._require(query, "year"), "year")
+                body = service.export(nif, file, fiscal_year=year)
+                if errors := service.validate(body):
+                    self._send_json(
+                        dict(
+                            error="declaration does not match its schema",
+                            errors=[attrs.asdict(error) for error in errors],
+                        ),
+                        status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                    )
+                else:
+                    self._send(HTTPStatus.OK, body, "application/xml")
+        except NotFoundError as e:
+            self._send_error(HTTPStatus.NOT_FOUND, str(e))
+        except BadRequestError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        except schema.SchemaLoadError as e:
+            _logger.error("%s", e)
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+        except Exception as e:
+            _logger.exception("failed to handle %s", self.path)
+            self._send_error(
+                HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}"
+            )
+
+    @staticmethod
+    def _require(query: dict, name: str) -> str:
+        if not query.get(name):
+            raise BadRequestError(f"missing query parameter {name}")
+        return query[name]
+
+    @staticmethod
+    def _int(value: str, name: str) -> int:
+        try:
+            return int(value)
+        except ValueError:
+            raise BadRequestError(f"query parameter {name} must be an integer")
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data, status=HTTPStatus.OK):
+        self._send(status, json.dumps(data).encode("utf-8"), "application/json")
+
+    def _send_error(self, status: HTTPStatus, message: str):
+        self._send_json(dict(error=message), status=status)
+
+    def log_message(self, format, *args):
+        _logger.info("%s - %s", self.address_string(), format % args)
+
+
+class DeclarationServer(HTTPServer):
+    def __init__(self, address, service: DeclarationService):
+        super().__init__(address, DeclarationRequestHandler)
+        self.service = service
+
+
+def serve(
+    data_dir,
+    host=DEFAULT_HOST,
+    port=DEFAULT_PORT,
+    cache_size=32,
+    fx=None,
+    mapped=False,
+    schema_dir=None,
+    templates_dir=None,
+):
+    service = DeclarationService(
+        data_dir=data_dir,
+        cache_size=cache_size,
+        fx=fx,
+        mapped=mapped,
+        schema_dir=schema_dir,
+        templates_dir=templates_dir,
+    )
+    with DeclarationServer((host, port), service) as server:
+        _logger.info("serving declarations for %s on %s:%d", data_dir, host, port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            _logger.info("shutting down")
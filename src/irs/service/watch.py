@@ -0,0 +1,160 @@
+import copy
+import logging
+import pathlib
+import time
+import typing as t
+import xml.etree.ElementTree as ET
+
+import attr
+import attrs
+
+from irs.broker.degiro import Portfolio
+from irs.broker.fx import FxRates
+from irs.model import schema
+from irs.model.model import IRS
+from irs.service.cache import file_signature
+
+_logger = logging.getLogger(__name__)
+
+
+@attrs.define
+class IncrementalPortfolio:
+    """Harmonized rows kept per csv file so a new export only re-matches its ISINs.
+
+    Rows are grouped by ISIN inside each file; gathering an ISIN across files in
+    file order reproduces the row order of ``Portfolio.read``, so the sale
+    records are the same as a full ``Portfolio.from_transaction_csv_files`` run.
+    """
+
+    input_dir: pathlib.Path
+    fx: t.Optional[FxRates] = None
+    mapped: bool = False
+    _files: t.Dict[str, t.Tuple[t.Tuple, t.Dict[str, t.List[dict]]]] = attr.ib(
+        factory=dict, init=False, repr=False
+    )
+    _records: t.Dict[str, t.List[dict]] = attr.ib(factory=dict, init=False, repr=False)
+
+    @staticmethod
+    def _group_by_isin(rows: t.List[dict]) -> t.Dict[str, t.List[dict]]:
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row["isin"], []).append(row)
+        return grouped
+
+    def refresh(self) -> t.Set[str]:
+        """Ingest new, changed or removed files and return the re-matched ISINs.
+
+        Changes are only kept once every changed file has been harmonized and
+        matched, a half-written export is picked up again on the next refresh.
+        """
+        current = {}
+        for file_path in Portfolio.csv_files(self.input_dir):
+            try:
+                current[file_path] = file_signature(file_path)
+            except FileNotFoundError:
+                continue
+        files = dict(self._files)
+        affected = set()
+        for file_path in [p for p in files if p not in current]:
+            _logger.info("removed %s", file_path)
+            affected.update(files.pop(file_path)[1])
+        for file_path, signature in current.items():
+            previous = files.get(file_path)
+            if previous is not None and previous[0] == signature:
+                continue
+            _logger.info("ingesting %s", file_path)
+            raw_rows = Portfolio.read_file(file_path, mapped=self.mapped)
+            grouped = self._group_by_isin(
+                Portfolio.harmonize_data(raw_rows, fx=self.fx)
+            )
+            if previous is not None:
+                affected.update(previous[1])
+            affected.update(grouped)
+            files[file_path] = (signature, grouped)
+
+        if affected:
+            files = dict(sorted(files.items()))
+            records = self._match(files, affected)
+            self._files = files
+            for isin in affected:
+                self._records.pop(isin, None)
+            self._records.update(records)
+        return affected
+
+    @staticmethod
+    def _match(files, isins: t.Set[str]) -> t.Dict[str, t.List[dict]]:
+        rows = [
+            row
+            for _, grouped in files.values()
+            for isin in isins
+            for row in grouped.get(isin, ())
+        ]
+        portfolio = Portfolio()
+        portfolio.load(rows)
+        return {prod.isin: prod.declare() for prod in portfolio.products}
+
+    @property
+    def sales(self) -> t.List[dict]:
+        isins = dict.fromkeys(
+            isin for _, grouped in self._files.values() for isin in grouped
+        )
+        return [record for isin in isins for record in self._records.get(isin, ())]
+
+
+def watch(
+    input_dir,
+    file: pathlib.Path,
+    output,
+    fiscal_year: int,
+    interval=1.0,
+    fx: t.Optional[FxRates] = None,
+    mapped=False,
+    schema_dir=None,
+):
+    """Poll ``input_dir`` and rewrite ``output`` whenever the declaration changes."""
+    portfolio = IncrementalPortfolio(input_dir=input_dir, fx=fx, mapped=mapped)
+    template, template_signature = None, None
+    dirty = False
+    _logger.info("watching %s every %.1fs", input_dir, interval)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                affected = portfolio.refresh()
+                if (signature := file_signature(file)) != template_signature:
+                    root = ET.parse(str(file)).getroot()
+                    if schema_dir is not None:
+                        # Resolve the xsd before any export, it may follow the template.
+                        schema.declaration_schema(root, schema_dir)
+                    template, template_signature = root, signature
+                    affected.add(str(file))
+                dirty = dirty or bool(affected)
+                if dirty:
+                    irs = IRS()
+                    irs.load_root(copy.deepcopy(template))
+                    irs.declare(portfolio.sales, fiscal_year=fiscal_year)
+                    body = irs.tostring()
+                    errors = []
+                    if schema_dir is not None:
+                        errors = schema.validate(body, schema_dir)
+                    dirty = False
+                    if errors:
+                        # Keep the last valid declaration until the data changes.
+                        for error in errors:
+                            _logger.error("%s %s", output, error)
+                        _logger.error("kept %s, the new declaration is invalid", output)
+                    else:
+                        pathlib.Path(output).write_bytes(body)
+                        _logger.info(
+                            "rewrote %s for %d changes in %.3fs",
+                            output,
+                            len(affected),
+                            time.perf_counter() - start,
+                        )
+            except schema.SchemaLoadError as e:
+                _logger.error("%s, retrying", e)
+            except Exception:
+                _logger.exception("failed to update %s, retrying", output)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        _logger.info("stopped watching %s", input_dir)
@@ -0,0 +1,71 @@
+import pathlib
+
+import pytest
+
+HEADER = (
+    "Data,Hora,Produto,ISIN,Bolsa de referência,Bolsa,Quantidade,Preços,,"
+    "Valor local,,Valor,,Taxa de Câmbio,Custos de transação,,Total,,ID da Ordem\n"
+)
+
+ROWS = (
+    '15-03-2023,10:00,VANGUARD FTSE,IE00B3RBWM25,EAM,XAMS,10,"100,00",EUR,'
+    '"-1000,00",EUR,"-1000,00",EUR,,"-2,00",EUR,"-1002,00",EUR,o1\n'
+    '20-06-2024,10:00,VANGUARD FTSE,IE00B3RBWM25,EAM,XAMS,-4,"120,00",EUR,'
+    '"480,00",EUR,"480,00",EUR,,"-2,00",EUR,"478,00",EUR,o2\n'
+    '01-02-2024,10:00,APPLE,US0378331005,NDQ,XNAS,5,"150,00",USD,'
+    '"-750,00",USD,"-690,00",EUR,"1,087","-1,00",EUR,"-691,00",EUR,o3\n'
+    '10-10-2024,10:00,APPLE,US0378331005,NDQ,XNAS,-5,"200,00",USD,'
+    '"1000,00",USD,"920,00",EUR,"1,087","-1,00",EUR,"919,00",EUR,o4\n'
+)
+
+TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Modelo3IRSv2025 xmlns="http://www.dgci.gov.pt/2009/Modelo3IRSv2025">'
+    "<Rosto><AnoRendimentos>2024</AnoRendimentos></Rosto>"
+    "<AnexoJ><Quadro09></Quadro09></AnexoJ></Modelo3IRSv2025>\n"
+)
+
+# Accepts any content under the 2025 root, enough to exercise the validation path.
+XSD = (
+    '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+    'targetNamespace="http://www.dgci.gov.pt/2009/Modelo3IRSv2025" '
+    'elementFormDefault="qualified">'
+    '<xs:element name="Modelo3IRSv2025"><xs:complexType><xs:sequence>'
+    '<xs:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/>'
+    "</xs:sequence></xs:complexType></xs:element></xs:schema>\n"
+)
+
+
+def _write_export(input_dir: pathlib.Path, name="a.csv", rows=ROWS):
+    input_dir.mkdir(parents=True, exist_ok=True)
+    path = input_dir / name
+    path.write_text(HEADER + rows, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def write_export():
+    """Write a Degiro transactions export, the sample rows by default."""
+    return _write_export
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data = tmp_path / "data"
+    _write_export(data / "123456789")
+    return data
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / "decl.xml"
+    path.write_text(TEMPLATE, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def schema_dir(tmp_path):
+    path = tmp_path / "xsd"
+    path.mkdir()
+    (path / "Modelo3IRSv2025.xsd").write_text(XSD, encoding="utf-8")
+    return path
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from irs import cli
+
+NIF = "123456789"
+
+
+def run(capsys, *argv):
+    cli.main([str(arg) for arg in argv])
+    return capsys.readouterr().out
+
+
+def usage_error(capsys, *argv):
+    with pytest.raises(SystemExit) as error:
+        cli.parse_arguments([str(arg) for arg in argv])
+    assert error.value.code == 2
+    return capsys.readouterr().err
+
+
+def test_required_arguments(capsys, data_dir):
+    assert "-i/--input" in usage_error(capsys, "-d", data_dir, "-t", NIF)
+    assert "-t/--tax-id" in usage_error(capsys, "--check", "-d", data_dir)
+
+
+def test_json_requires_check(capsys, data_dir, template):
+    error = usage_error(capsys, "-i", template, "-d", data_dir, "-t", NIF, "--json")
+    assert "--json requires --check" in error
+
+
+def test_check_json(capsys, data_dir):
+    out = run(capsys, "--check", "--json", "-d", data_dir, "-t", NIF, "-y", 2024)
+    report = json.loads(out)
+    assert report["fiscal_year"] == 2024
+    assert report["years"]["2024"]["lines"] == 2
+    assert report["years"]["2024"]["soma_c01"] == pytest.approx(1400.0)
+    assert report["diff"] == {}
+
+
+def test_check_matches_exported_declaration(capsys, data_dir, template, tmp_path):
+    output = tmp_path / "out.xml"
+    run(capsys, "-i", template, "-d", data_dir, "-t", NIF, "-o", output, "-y", 2024)
+    out = run(capsys, "--check", "-i", output, "-d", data_dir, "-t", NIF, "-y", 2024)
+    assert f"{output} matches for 2024." in out
+
+
+def test_check_reports_differences(capsys, data_dir, template):
+    argv = ("-i", template, "-d", data_dir, "-t", NIF, "-y", 2024)
+    with pytest.raises(SystemExit) as error:
+        run(capsys, "--check", "--json", *argv)
+    assert error.value.code == 1
+    diff = json.loads(capsys.readouterr().out)["diff"]
+    assert set(diff) == {"lines", "soma_c01", "soma_c02", "soma_c03"}
+    assert diff["lines"] == dict(declared=0, computed=2)
+    assert diff["soma_c01"]["computed"] == pytest.approx(1400.0)
+
+
+@pytest.mark.parametrize("option", ["--check", "--json"])
+@pytest.mark.parametrize("command", ["serve", "watch"])
+def test_check_options_reject_subcommands(capsys, data_dir, template, option, command):
+    argv = [option, command, "-d", data_dir]
+    if command == "watch":
+        argv += ["-i", template, "-t", NIF]
+    error = usage_error(capsys, *argv)
+    assert f"{option} cannot be combined with {command}" in error
+
+
+def test_top_level_options_reach_subcommands(data_dir, template):
+    args = cli.parse_arguments(
+        ["--fx-rates", "r.csv", "--mmap", "-o", "out.xml"]
+        + ["watch", "-i", str(template), "-d", str(data_dir), "-t", NIF]
+    )
+    assert (str(args.fx_rates), args.mmap, str(args.output)) == (
+        "r.csv",
+        True,
+        "out.xml",
+    )
+    args = cli.parse_arguments(
+        ["--fx-rates", "r.csv", "positions", "-d", str(data_dir), "-t", NIF]
+        + ["--date", "2024-01-01", "--fx-rates", "s.csv"]
+    )
+    assert (str(args.fx_rates), args.mmap) == ("s.csv", False)
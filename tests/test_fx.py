@@ -0,0 +1,129 @@
+from collections import namedtuple
+from datetime import date, datetime
+
+import pytest
+
+from irs.broker.degiro import Portfolio
+from irs.broker.fx import FxRates
+from irs.plus500.currency import quote_currency
+
+# eurofxref-hist.csv layout: newest first, trailing comma, N/A for missing.
+WIDE = (
+    "Date,USD,JPY,\n"
+    "2024-02-02,1.0900,160.00,\n"
+    "2024-02-01,1.0800,N/A,\n"
+    "2024-01-26,1.0850,158.50,\n"
+)
+
+SDMX = (
+    "KEY,FREQ,CURRENCY,CURRENCY_DENOM,TIME_PERIOD,OBS_VALUE\n"
+    "EXR.D.GBP.EUR.SP00.A,D,GBP,EUR,2024-02-01,0.8500\n"
+    "EXR.D.GBP.EUR.SP00.A,D,GBP,EUR,2024-02-02,NaN\n"
+)
+
+
+@pytest.fixture
+def rates_dir(tmp_path):
+    path = tmp_path / "fx"
+    path.mkdir()
+    (path / "eurofxref-hist.csv").write_text(WIDE, encoding="utf-8")
+    (path / "gbp.csv").write_text(SDMX, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def fx(rates_dir):
+    return FxRates.from_csv_files(rates_dir)
+
+
+def test_layouts(rates_dir):
+    assert list(FxRates.read(rates_dir / "gbp.csv")) == [
+        ("GBP", date(2024, 2, 1).toordinal(), 0.85)
+    ]
+    wide = FxRates.from_csv_files(rates_dir / "eurofxref-hist.csv")
+    assert wide.currencies == ["JPY", "USD"]
+    assert FxRates.from_csv_files(rates_dir).currencies == ["GBP", "JPY", "USD"]
+
+
+def test_rate_lookup(fx):
+    assert fx.rate("EUR", date(1999, 1, 1)) == 1.0
+    assert fx.to_eur(108, "USD", date(2024, 2, 1)) == pytest.approx(100.0)
+    # Weekends and N/A days fall back to the latest earlier rate.
+    assert fx.rate("USD", datetime(2024, 2, 4, 15, 30)) == 1.09
+    assert fx.rate("JPY", date(2024, 2, 1)) == 158.5
+    assert fx.rate("GBP", date(2024, 2, 2)) == 0.85
+
+
+@pytest.mark.parametrize(
+    "currency, when",
+    [
+        ("USD", date(2024, 3, 1)),
+        ("USD", date(2024, 1, 1)),
+        ("CHF", date(2024, 2, 1)),
+    ],
+)
+def test_rate_missing(fx, currency, when):
+    with pytest.raises(LookupError):
+        fx.rate(currency, when)
+
+
+def test_max_age(rates_dir):
+    fx = FxRates.from_csv_files(rates_dir, max_age=2)
+    assert fx.rate("USD", date(2024, 2, 4)) == 1.09
+    with pytest.raises(LookupError, match="within 2 days"):
+        fx.rate("JPY", date(2024, 2, 1))
+
+
+def test_to_eur_many(fx):
+    currencies = ["USD", "EUR", "JPY", "USD"]
+    dates = [date(2024, 2, 1), date(2024, 2, 1), date(2024, 2, 2), date(2024, 2, 2)]
+    assert list(fx.rates(currencies, dates)) == [1.08, 1.0, 160.0, 1.09]
+    assert fx.to_eur_many([108, 5, 1600, 109], currencies, dates) == pytest.approx(
+        [100.0, 5.0, 10.0, 100.0]
+    )
+
+
+@pytest.mark.parametrize("mapped", [False, True])
+def test_harmonize_converts_rows_without_eur_value(fx, tmp_path, write_export, mapped):
+    rows = (
+        '01-02-2024,10:00,APPLE,US0378331005,NDQ,XNAS,5,"21,60",USD,'
+        '"-108,00",USD,,,,"-1,00",EUR,,,o1\n'
+        '02-02-2024,10:00,APPLE,US0378331005,NDQ,XNAS,-5,"21,80",USD,'
+        '"109,00",USD,"90,00",EUR,,"-1,00",EUR,,,o2\n'
+    )
+    raw_rows = Portfolio.read_file(write_export(tmp_path, rows=rows), mapped=mapped)
+
+    harmonized = Portfolio.harmonize_data(raw_rows, fx=fx)
+    # Converted at the trade-date rate, a given EUR value is kept as is.
+    assert [row["value"] for row in harmonized] == pytest.approx([-100.0, 90.0])
+    assert [row["value"] for row in Portfolio.harmonize_data(raw_rows)] == [
+        -108.0,
+        90.0,
+    ]
+
+
+Row = namedtuple("Row", "Instrument Exchange_Rate Open_Value")
+
+
+@pytest.mark.parametrize(
+    "row, currency",
+    [
+        (Row("Apple", "EUR/USD 1.0856", "$1,230.00"), "USD"),
+        (Row("Nikkei", "EUR/JPY 160.2", "¥120000"), "JPY"),
+        (Row("Gold", "EUR/GBP 0.85", "1200.00"), "GBP"),
+    ],
+)
+def test_plus500_quote_currency(row, currency):
+    assert quote_currency(row) == currency
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        Row("Apple", "EUR/EUR --", "$1,230.00"),
+        Row("Apple", "EUR/JPY 160.2", "$1,230.00"),
+    ],
+)
+def test_plus500_quote_currency_mismatch(row):
+    with pytest.raises(RuntimeError, match="cannot tell the currency"):
+        quote_currency(row)
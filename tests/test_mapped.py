@@ -0,0 +1,63 @@
+import csv
+import io
+
+import pytest
+
+from irs.broker.degiro import Portfolio
+from irs.broker.mapped import MappedCsvFile
+
+SAMPLES = {
+    "plain": "a,b,c\n1,2,3\n",
+    "quoted": 'a,"b,c","say ""hi"""\n"",x,\n',
+    "multiline": 'a,"line one\nline two",c\nd,e,f\n',
+    "crlf": 'a,b\r\n1,"2\r\n3",4\r\n',
+    "short": "a,b,c\n1\n",
+    "no_trailing_newline": "a,b\n1,2",
+    "blank_lines": "a,b\n\n1,2\r\n\r\n3,4\n",
+}
+
+
+def write(tmp_path, text, name="sample.csv"):
+    path = tmp_path / name
+    path.write_bytes(text.encode("utf-8"))
+    return path
+
+
+def expected(text, blank=False):
+    rows = list(csv.reader(io.StringIO(text, newline="")))
+    return rows if blank else [row for row in rows if row]
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_records_match_csv_reader(tmp_path, name):
+    text = SAMPLES[name]
+    with MappedCsvFile(write(tmp_path, text)) as f:
+        assert list(f.records()) == expected(text)
+        assert list(f.records(blank=True)) == expected(text, blank=True)
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_projection_and_skip(tmp_path, name):
+    text = SAMPLES[name]
+    rows = expected(text)
+    with MappedCsvFile(write(tmp_path, text)) as f:
+        assert list(f.records(indexes=[2, 0])) == [
+            [row[i] if i < len(row) else "" for i in (2, 0)] for row in rows
+        ]
+        assert list(f.records(skip=1)) == rows[1:]
+
+
+def test_bom_and_empty_file(tmp_path):
+    with MappedCsvFile(write(tmp_path, "\ufeffa,b\n1,2\n")) as f:
+        assert f.header() == ["a", "b"]
+    with MappedCsvFile(write(tmp_path, "", name="empty.csv")) as f:
+        assert f.header() == []
+        assert list(f.records(blank=True)) == []
+
+
+def test_mapped_read_file_matches_csv(data_dir):
+    file_path = data_dir / "123456789" / "a.csv"
+    mapped = Portfolio.read_file(file_path, mapped=True)
+    assert Portfolio.harmonize_data(mapped) == Portfolio.harmonize_data(
+        Portfolio.read_file(file_path)
+    )
@@ -0,0 +1,101 @@
+import json
+from datetime import date
+
+import pytest
+
+from irs import cli
+from irs.broker.degiro import Portfolio
+
+NIF = "123456789"
+
+# A second VANGUARD buy and a sale spanning both lots.
+MORE_ROWS = (
+    '10-01-2024,10:00,VANGUARD FTSE,IE00B3RBWM25,EAM,XAMS,5,"110,00",EUR,'
+    '"-550,00",EUR,"-550,00",EUR,,"-1,00",EUR,"-551,00",EUR,o5\n'
+    '05-05-2025,10:00,VANGUARD FTSE,IE00B3RBWM25,EAM,XAMS,-8,"130,00",EUR,'
+    '"1040,00",EUR,"1040,00",EUR,,"-1,00",EUR,"1039,00",EUR,o6\n'
+)
+
+
+@pytest.fixture
+def index(data_dir, write_export):
+    input_dir = data_dir / NIF
+    write_export(input_dir, name="b.csv", rows=MORE_ROWS)
+    return Portfolio.from_transaction_csv_files(input_dir=input_dir).position_index()
+
+
+def lots(position):
+    return [(lot.date.date(), lot.unit, lot.unit_cost) for lot in position.lots]
+
+
+def test_fifo_lots(index):
+    isin = "IE00B3RBWM25"
+    assert index.position(isin, date(2023, 3, 14)).unit == 0
+    assert lots(index.position(isin, date(2023, 3, 15))) == [
+        (date(2023, 3, 15), 10, 100.0)
+    ]
+
+    position = index.position(isin, date(2024, 6, 20))
+    assert position.unit == 11
+    assert lots(position) == [
+        (date(2023, 3, 15), 6, 100.0),
+        (date(2024, 1, 10), 5, 110.0),
+    ]
+    assert position.cost == pytest.approx(1150.0)
+
+    position = index.position(isin, date(2025, 12, 31))
+    assert position.unit == 3
+    assert lots(position) == [(date(2024, 1, 10), 3, 110.0)]
+    assert index.position(isin, date(2025, 12, 31), lots=False).lots == []
+
+
+def test_realized_matches_declare(data_dir, index):
+    portfolio = Portfolio.from_transaction_csv_files(input_dir=data_dir / NIF)
+    sales, _ = portfolio.declare()
+    realized = sum(
+        s["realization_value"] - s["acquisition_value"] - s["expenses"] for s in sales
+    )
+    positions = index.positions(date(2025, 12, 31))
+    assert sum(p.realized for p in positions) == pytest.approx(realized)
+
+
+def test_closed_positions(index):
+    assert index.positions(date(2023, 1, 1)) == []
+    assert [p.isin for p in index.positions(date(2023, 1, 1), include_closed=True)] == [
+        "US0378331005",
+        "IE00B3RBWM25",
+    ]
+    closed = index.position("US0378331005", date(2024, 12, 31))
+    assert (closed.unit, closed.lots) == (0, [])
+    assert closed.realized == pytest.approx(228.0)
+
+
+def test_unknown_isin(index):
+    with pytest.raises(LookupError):
+        index.position("XX0000000000", date(2024, 1, 1))
+
+
+def test_cli_json(capsys, data_dir):
+    cli.main(
+        [
+            *("positions", "-d", str(data_dir), "-t", NIF, "--json", "--lots"),
+            *("--date", "2024-06-20", "--isin", "IE00B3RBWM25"),
+        ]
+    )
+    (position,) = json.loads(capsys.readouterr().out)["2024-06-20"]
+    assert position["unit"] == 6
+    assert position["cost"] == pytest.approx(600.0)
+    assert position["lots"] == [
+        dict(date="2023-03-15T00:00:00", unit=6, unit_cost=100.0, cost=600.0)
+    ]
+
+
+def test_cli_unknown_isin(data_dir):
+    with pytest.raises(SystemExit) as error:
+        cli.main(
+            [
+                *("positions", "-d", str(data_dir), "-t", NIF),
+                *("--date", "2024-06-20", "--isin", "XX0000000000"),
+            ]
+        )
+    assert error.value.code == 1
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from irs import cli
+from irs.model import schema
+
+NIF = "123456789"
+
+# Only a Rosto is allowed under the root, the exported AnexoJ is rejected.
+STRICT_XSD = (
+    '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+    'targetNamespace="http://www.dgci.gov.pt/2009/Modelo3IRSv2025" '
+    'elementFormDefault="qualified">'
+    '<xs:element name="Modelo3IRSv2025"><xs:complexType><xs:sequence>'
+    '<xs:element name="Rosto" type="xs:anyType"/>'
+    "</xs:sequence></xs:complexType></xs:element></xs:schema>\n"
+)
+
+
+def export(data_dir, template, output, schema_dir):
+    cli.main(
+        [
+            *("-i", str(template), "-d", str(data_dir), "-t", NIF),
+            *("-o", str(output), "-y", "2024", "--schema-dir", str(schema_dir)),
+        ]
+    )
+
+
+def test_export_validates(data_dir, template, schema_dir, tmp_path):
+    output = tmp_path / "out.xml"
+    export(data_dir, template, output, schema_dir)
+    assert schema.validate(output, schema_dir) == []
+    assert schema.validate(output.read_bytes(), schema_dir) == []
+
+
+def test_invalid_export_is_not_written(
+    caplog, data_dir, template, schema_dir, tmp_path
+):
+    (schema_dir / "Modelo3IRSv2025.xsd").write_text(STRICT_XSD, encoding="utf-8")
+    output = tmp_path / "out.xml"
+    with pytest.raises(SystemExit) as error:
+        export(data_dir, template, output, schema_dir)
+    assert error.value.code == 1
+    assert not output.exists()
+    assert "AnexoJ': This element is not expected" in caplog.text
+
+
+@pytest.mark.parametrize("xsd", [None, "<xs:schema"])
+def test_unusable_schema_fails_before_export(
+    data_dir, template, schema_dir, tmp_path, xsd
+):
+    path = schema_dir / "Modelo3IRSv2025.xsd"
+    if xsd is None:
+        path.unlink()
+    else:
+        path.write_text(xsd, encoding="utf-8")
+    output = tmp_path / "out.xml"
+    with pytest.raises(SystemExit) as error:
+        export(data_dir, template, output, schema_dir)
+    assert error.value.code == 1
+    assert not output.exists()
+    with pytest.raises(schema.SchemaLoadError):
+        schema.load_schema(path)
+
+
+def test_unknown_namespace(schema_dir):
+    with pytest.raises(schema.SchemaLoadError, match="unknown declaration namespace"):
+        schema.schema_path(schema_dir, "http://example.com/Modelo3IRSv1999")
+
+
+def test_schema_dir_must_exist(capsys, data_dir, template, tmp_path):
+    with pytest.raises(SystemExit):
+        export(data_dir, template, tmp_path / "out.xml", tmp_path / "missing")
+    assert "is not a directory" in capsys.readouterr().err
+
+
+def test_compiled_once_per_path(schema_dir):
+    path = schema_dir / "Modelo3IRSv2025.xsd"
+    compiled = schema.load_schema(path)
+    assert schema.load_schema(path) is compiled
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert schema.load_schema(path) is not compiled
+    assert list(schema._compiled).count(str(path)) == 1
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from urllib.error import HTTPError
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from irs.service.client import Client
+from irs.service.server import DeclarationServer, DeclarationService
+
+NIF = "123456789"
+NS = "{http://www.dgci.gov.pt/2009/Modelo3IRSv2025}"
+
+
+@pytest.fixture
+def service(data_dir, template):
+    return DeclarationService(
+        data_dir=data_dir, cache_size=2, templates_dir=template.parent
+    )
+
+
+@pytest.fixture
+def client(service):
+    server = DeclarationServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield Client(f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+    server.server_close()
+
+
+def touch(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def status(call):
+    with pytest.raises(HTTPError) as error:
+        call()
+    return error.value.code
+
+
+def test_summary(client):
+    summary = client.summary(NIF)
+    assert summary["sales"] == 2
+    assert [p["isin"] for p in summary["open_positions"]] == ["IE00B3RBWM25"]
+    assert {p["isin"]: p["unit"] for p in summary["products"]} == {
+        "IE00B3RBWM25": 6,
+        "US0378331005": 0,
+    }
+
+
+def test_declare(client):
+    records = client.declare(NIF, fiscal_year=2024)["records"]
+    assert [r["linha"] for r in records] == [951, 952]
+    assert records[0]["realization_date"] == "2024-06-20T00:00:00"
+    assert records[0]["acquisition_value"] == pytest.approx(400.0)
+    assert client.declare(NIF, fiscal_year=2023)["records"] == []
+
+
+def test_export(client, template, tmp_path):
+    output = tmp_path / "out.xml"
+    body = client.export(NIF, template, 2024, output=output)
+    assert output.read_bytes() == body
+    root = ET.fromstring(body)
+    assert len(root.findall(f".//{NS}AnexoJq092AT01-Linha")) == 2
+    assert root.find(f".//{NS}AnexoJq092AT01SomaC01").text == "1400.00"
+    assert root.find(f".//{NS}AnexoJq092AT01SomaC03").text == "4.80"
+
+
+def test_cache_hit_and_mtime_invalidation(client, service, data_dir, template):
+    client.summary(NIF)
+    client.declare(NIF)
+    assert (service.portfolios.misses, service.portfolios.hits) == (1, 1)
+
+    touch(data_dir / NIF / "a.csv")
+    client.summary(NIF)
+    assert service.portfolios.misses == 2
+
+    client.export(NIF, template, 2024)
+    client.export(NIF, template, 2024)
+    touch(template)
+    client.export(NIF, template, 2024)
+    assert (service.templates.misses, service.templates.hits) == (2, 1)
+
+
+def test_cache_eviction(client, service, data_dir, write_export):
+    write_export(data_dir / "111111111")
+    write_export(data_dir / "222222222")
+    for nif in (NIF, "111111111", "222222222", NIF):
+        client.summary(nif)
+    assert len(service.portfolios) == 2
+    assert service.portfolios.misses == 4
+
+
+def test_not_found(client, template):
+    assert status(lambda: client.summary("987654321")) == 404
+    assert status(lambda: client.summary("../data")) == 404
+    assert status(lambda: client.export(NIF, template.with_name("x.xml"), 2024)) == 404
+    assert status(lambda: client._get("/unknown", nif=NIF)) == 404
+
+
+def test_templates_are_confined(client, service, template):
+    assert client.export(NIF, template.name, 2024) == client.export(NIF, template, 2024)
+    service.templates_dir = service.data_dir
+    assert status(lambda: client.export(NIF, template, 2024)) == 404
+    assert status(lambda: client.export(NIF, "../decl.xml", 2024)) == 404
+
+
+def test_bad_request(client):
+    assert status(lambda: client._get("/summary")) == 400
+    assert status(lambda: client._get("/declare", nif=NIF, year="last")) == 400
+    assert status(lambda: client._get("/export", nif=NIF, year=2024)) == 400
+
+
+def test_model_errors_are_server_errors(client, data_dir, template, write_export):
+    # FR has no country code, a KeyError inside the model is not a 404.
+    rows = (
+        '01-02-2024,10:00,TOTAL,FR0000120271,EPA,XPAR,5,"50,00",EUR,'
+        '"-250,00",EUR,"-250,00",EUR,,"-1,00",EUR,"-251,00",EUR,f1\n'
+        '01-03-2024,10:00,TOTAL,FR0000120271,EPA,XPAR,-5,"60,00",EUR,'
+        '"300,00",EUR,"300,00",EUR,,"-1,00",EUR,"299,00",EUR,f2\n'
+    )
+    write_export(data_dir / "333333333", rows=rows)
+    assert status(lambda: client.export("333333333", template, 2024)) == 500
+
+    write_export(data_dir / "444444444", rows="01-0")
+    assert status(lambda: client.summary("444444444")) == 500
+
+
+def test_export_schema(client, service, template, schema_dir):
+    service.schema_dir = schema_dir
+    assert client.export(NIF, template, 2024).startswith(b"<?xml")
+
+    (schema_dir / "Modelo3IRSv2025.xsd").write_text("<xs:schema", encoding="utf-8")
+    with pytest.raises(HTTPError) as error:
+        client.export(NIF, template, 2024)
+    assert error.value.code == 500
+    assert "cannot load schema" in json.loads(error.value.read())["error"]
@@ -0,0 +1,133 @@
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from irs.broker.degiro import Portfolio
+from irs.service import watch as watch_module
+from irs.service.watch import IncrementalPortfolio
+
+NS = "{http://www.dgci.gov.pt/2009/Modelo3IRSv2025}"
+
+NEW_SALE = (
+    '05-05-2025,10:00,VANGUARD FTSE,IE00B3RBWM25,EAM,XAMS,-2,"130,00",EUR,'
+    '"260,00",EUR,"260,00",EUR,,"-1,00",EUR,"259,00",EUR,o5\n'
+)
+
+
+def full_run(input_dir):
+    sales, _ = Portfolio.from_transaction_csv_files(input_dir=input_dir).declare()
+    return sales
+
+
+def test_refresh_matches_full_run(data_dir, write_export):
+    input_dir = data_dir / "123456789"
+    portfolio = IncrementalPortfolio(input_dir=input_dir)
+    assert portfolio.refresh() == {"IE00B3RBWM25", "US0378331005"}
+    assert portfolio.sales == full_run(input_dir)
+
+    new_file = write_export(input_dir, name="b.csv", rows=NEW_SALE)
+    assert portfolio.refresh() == {"IE00B3RBWM25"}
+    assert portfolio.sales == full_run(input_dir)
+    assert portfolio.refresh() == set()
+
+    new_file.unlink()
+    assert portfolio.refresh() == {"IE00B3RBWM25"}
+    assert portfolio.sales == full_run(input_dir)
+
+
+def test_refresh_keeps_state_on_truncated_export(data_dir, write_export):
+    input_dir = data_dir / "123456789"
+    portfolio = IncrementalPortfolio(input_dir=input_dir)
+    portfolio.refresh()
+    sales = portfolio.sales
+
+    write_export(input_dir, name="b.csv", rows=NEW_SALE[:4])
+    with pytest.raises(ValueError):
+        portfolio.refresh()
+    assert portfolio.sales == sales
+
+    write_export(input_dir, name="b.csv", rows=NEW_SALE)
+    assert portfolio.refresh() == {"IE00B3RBWM25"}
+    assert portfolio.sales == full_run(input_dir)
+
+
+def test_watch_survives_failed_polls(
+    data_dir, template, tmp_path, monkeypatch, write_export
+):
+    input_dir = data_dir / "123456789"
+    output = tmp_path / "out.xml"
+    steps = [
+        lambda: write_export(input_dir, name="b.csv", rows=NEW_SALE[:4]),
+        lambda: template.rename(tmp_path / "moved.xml"),
+        lambda: (tmp_path / "moved.xml").rename(template),
+        lambda: write_export(input_dir, name="b.csv", rows=NEW_SALE),
+    ]
+
+    def sleep(_):
+        if not steps:
+            raise KeyboardInterrupt
+        steps.pop(0)()
+
+    monkeypatch.setattr(watch_module.time, "sleep", sleep)
+    watch_module.watch(input_dir, template, output, fiscal_year=2025)
+
+    root = ET.parse(output).getroot()
+    assert len(root.findall(f".//{NS}AnexoJq092AT01-Linha")) == 1
+    assert root.find(f".//{NS}AnexoJq092AT01SomaC01").text == "260.00"
+
+
+def test_watch_waits_for_a_usable_schema(
+    data_dir, template, schema_dir, tmp_path, monkeypatch
+):
+    xsd = schema_dir / "Modelo3IRSv2025.xsd"
+    valid = xsd.read_text(encoding="utf-8")
+    xsd.write_text("<xs:schema", encoding="utf-8")
+    output = tmp_path / "out.xml"
+    written = []
+    steps = [
+        lambda: written.append(output.exists()),
+        lambda: xsd.write_text(valid, encoding="utf-8"),
+    ]
+
+    def sleep(_):
+        if not steps:
+            raise KeyboardInterrupt
+        steps.pop(0)()
+
+    monkeypatch.setattr(watch_module.time, "sleep", sleep)
+    watch_module.watch(
+        data_dir / "123456789", template, output, 2024, schema_dir=schema_dir
+    )
+    assert written == [False]
+    assert output.exists()
+
+
+def test_watch_keeps_last_valid_declaration(
+    caplog, data_dir, template, schema_dir, tmp_path, monkeypatch, write_export
+):
+    xsd = schema_dir / "Modelo3IRSv2025.xsd"
+    input_dir = data_dir / "123456789"
+    output = tmp_path / "out.xml"
+    snapshots = []
+    steps = [
+        lambda: snapshots.append(output.read_bytes()),
+        # Only a Rosto is allowed, the next declaration is rejected.
+        lambda: xsd.write_text(
+            xsd.read_text(encoding="utf-8").replace(
+                '<xs:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/>',
+                '<xs:element name="Rosto" type="xs:anyType"/>',
+            ),
+            encoding="utf-8",
+        ),
+        lambda: write_export(input_dir, name="b.csv", rows=NEW_SALE),
+    ]
+
+    def sleep(_):
+        if not steps:
+            raise KeyboardInterrupt
+        steps.pop(0)()
+
+    monkeypatch.setattr(watch_module.time, "sleep", sleep)
+    watch_module.watch(input_dir, template, output, 2025, schema_dir=schema_dir)
+    assert output.read_bytes() == snapshots[0]
+    assert "the new declaration is invalid" in caplog.text